@@ -2,8 +2,6 @@ import pandas as pd
 import numpy as np
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
 
 app = FastAPI()
 
@@ -40,6 +38,10 @@ def carregar_dados():
         return pd.DataFrame(data)
 
 def processar_clusters(df):
+    # Import tardio: o sklearn só é necessário na clusterização
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.cluster import KMeans
+
     # 1. Agrupamento por Item (conforme seu notebook)
     df_grouped = df.groupby('id_item').agg({
         'ds_material_hospital': 'first',
@@ -8,10 +8,23 @@ router = APIRouter()
 # Variável global para armazenar o dataframe bruto carregado pelo server.py
 df_raw_storage = None
 
+# Função registrada pelo server.py para carregar os dados sob demanda (primeiro uso)
+_carregador = None
+
 def set_df_raw(df):
     global df_raw_storage
     df_raw_storage = df
 
+def set_carregador(fn):
+    global _carregador
+    _carregador = fn
+
+def get_df_raw():
+    """Retorna o dataframe bruto, disparando o carregamento se ainda não ocorreu."""
+    if df_raw_storage is None and _carregador is not None:
+        _carregador()
+    return df_raw_storage
+
 @router.get("/api/insights/risk")
 def get_risk_insight():
     """
@@ -19,10 +32,11 @@ def get_risk_insight():
     - Calcula CV (Variabilidade) e Cobertura (Meses de Estoque).
     - Identifica itens críticos: CV > 0.8 (instável) E Cobertura < 1.0 (baixo estoque) E Alto Custo.
     """
-    if df_raw_storage is None:
+    df_raw = get_df_raw()
+    if df_raw is None:
         raise HTTPException(status_code=500, detail="Dados não carregados no servidor")
 
-    df = df_raw_storage.copy()
+    df = df_raw.copy()
     
     # Normalização de nomes de colunas para garantir compatibilidade
     col_map = {
@@ -96,10 +110,11 @@ def get_seasonality_insight():
     """
     Aplica a lógica de Sazonalidade vs Linearidade (Notebook Snippet 39/49)
     """
-    if df_raw_storage is None:
+    df_raw = get_df_raw()
+    if df_raw is None:
         raise HTTPException(status_code=500, detail="Dados não carregados")
 
-    df = df_raw_storage.copy()
+    df = df_raw.copy()
 
     # Detecção da coluna de data
     date_col = None
@@ -203,10 +218,11 @@ def get_strategic_insight():
     """
     Implementação Fiel de 'celula3.py': ABC-XYZ e Eficiência de Capital
     """
-    if df_raw_storage is None:
+    df_raw = get_df_raw()
+    if df_raw is None:
         raise HTTPException(status_code=500, detail="Dados não carregados")
 
-    df = df_raw_storage.copy()
+    df = df_raw.copy()
 
     col_map = {
         'ds_item': 'ds_material_hospital', 
@@ -299,10 +315,11 @@ def get_inflation_insight():
     4. Filtra sanidade (aumento < 1000%).
     5. Retorna Top 5 e Histórico para plotagem.
     """
-    if df_raw_storage is None:
+    df_raw = get_df_raw()
+    if df_raw is None:
         raise HTTPException(status_code=500, detail="Dados não carregados no servidor")
 
-    df = df_raw_storage.copy()
+    df = df_raw.copy()
     
     # --- 1. Preparação de Dados ---
     col_data = 'dt_movimento_estoque'
@@ -0,0 +1,433 @@
+# loadtest.py
+"""
+Teste de carga da API (server.py / app.py).
+
+Dispara requisições concorrentes contra o app ASGI em processo (sem rede) ou
+contra um uvicorn local, com um mix configurável de endpoints, e reporta
+latência p50/p95/p99, throughput e memória. O resultado pode ser salvo em JSON
+e comparado com uma execução anterior para detectar regressões entre commits.
+
+Exemplos:
+    python loadtest.py --alvo server --concorrencia 16 --requisicoes 400
+    python loadtest.py --url http://localhost:8000 --mix "/api/insights/risk=3,/api/dados-clusters=1"
+    python loadtest.py --url http://localhost:8000 --pid 12345
+    python loadtest.py --alvo server --saida base.json
+    python loadtest.py --alvo server --comparar base.json --tolerancia 20
+    python loadtest.py --alvo server --orcamento-importacao 1500
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+import httpx
+
+try:
+    import resource  # Indisponível no Windows
+except ImportError:
+    resource = None
+
+# Mix padrão de endpoints (caminho -> peso) para cada app
+MIX_PADRAO = {
+    'server': {
+        '/api/dados-clusters': 1,
+        '/api/insights/risk': 2,
+        '/api/insights/seasonality': 2,
+        '/api/insights/strategy': 2,
+        '/api/insights/inflation': 2,
+    },
+    'app': {
+        '/api/clusters': 2,
+        '/api/kpis': 3,
+    },
+}
+
+PERCENTIS = (50, 95, 99)
+
+# Campos de configuração que precisam coincidir para duas execuções serem comparáveis
+CONFIG_COMPARAVEL = ('modo', 'concorrencia', 'mix', 'requisicoes', 'duracao_s', 'semente')
+
+# Diretório do projeto: o import medido deve ser o de server.py/app.py ao lado deste script
+DIRETORIO_PROJETO = os.path.dirname(os.path.abspath(__file__))
+
+# Módulos pesados que não devem ser importados junto com o app (carregados sob demanda)
+MODULOS_TARDIOS = ('sklearn',)
+
+
+def parse_mix(texto):
+    """Converte "/a=3,/b=1" em {'/a': 3, '/b': 1}. Peso omitido vale 1."""
+    mix = {}
+    for parte in texto.split(','):
+        parte = parte.strip()
+        if not parte:
+            continue
+        caminho, _, peso = parte.partition('=')
+        mix[caminho.strip()] = int(peso) if peso else 1
+    if not mix or any(p <= 0 for p in mix.values()):
+        raise argparse.ArgumentTypeError(f"Mix inválido: {texto!r}")
+    return mix
+
+
+def percentil(valores_ordenados, p):
+    """Percentil por interpolação linear (mesmo critério do numpy)."""
+    if not valores_ordenados:
+        return 0.0
+    pos = (len(valores_ordenados) - 1) * p / 100
+    base = int(pos)
+    topo = min(base + 1, len(valores_ordenados) - 1)
+    return valores_ordenados[base] + (valores_ordenados[topo] - valores_ordenados[base]) * (pos - base)
+
+
+def memoria_pico_mb():
+    """Pico de memória residente do processo (RSS) em MB."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reporta em KB, macOS em bytes
+    return pico / (1024 * 1024) if sys.platform == 'darwin' else pico / 1024
+
+
+def memoria_pico_pid_mb(pid):
+    """Pico de RSS (VmHWM) de outro processo, via /proc (apenas Linux)."""
+    try:
+        with open(f'/proc/{pid}/status', encoding='ascii') as f:
+            for linha in f:
+                if linha.startswith('VmHWM:'):
+                    return int(linha.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def commit_atual():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def medir_importacao(modulo, repeticoes):
+    """Mede o tempo de `import modulo` em processos novos (cache frio do interpretador)."""
+    codigo = (
+        "import sys, time, json\n"
+        "t = time.perf_counter()\n"
+        f"import {modulo}\n"
+        "ms = (time.perf_counter() - t) * 1000\n"
+        f"tardios = [m for m in {MODULOS_TARDIOS!r} if m in sys.modules]\n"
+        "print(json.dumps({'ms': ms, 'tardios': tardios}))\n"
+    )
+    tempos, tardios = [], set()
+    for _ in range(repeticoes):
+        proc = subprocess.run(
+            [sys.executable, '-c', codigo], capture_output=True, text=True, cwd=DIRETORIO_PROJETO
+        )
+        if proc.returncode != 0:
+            raise RuntimeError(proc.stderr.strip() or f"código de saída {proc.returncode}")
+        dados = json.loads(proc.stdout.strip().splitlines()[-1])
+        tempos.append(dados['ms'])
+        tardios.update(dados['tardios'])
+    tempos.sort()
+    return {
+        'mediana_ms': round(percentil(tempos, 50), 1),
+        'min_ms': round(tempos[0], 1),
+        'max_ms': round(tempos[-1], 1),
+        'modulos_tardios_importados': sorted(tardios),
+    }
+
+
+def checar_importacao(args):
+    """Verifica o orçamento de tempo de importação do app. Retorna o código de saída."""
+    try:
+        resultado = medir_importacao(args.alvo, args.repeticoes_importacao)
+    except RuntimeError as e:
+        print(f"FALHA: não foi possível importar '{args.alvo}' de {DIRETORIO_PROJETO}:\n{e}")
+        return 2
+    print(f"import {args.alvo}: mediana {resultado['mediana_ms']} ms "
+          f"(min {resultado['min_ms']}, max {resultado['max_ms']}, "
+          f"{args.repeticoes_importacao} execuções) | orçamento {args.orcamento_importacao} ms")
+    falhou = False
+    if resultado['mediana_ms'] > args.orcamento_importacao:
+        print("FALHA: tempo de importação acima do orçamento.")
+        falhou = True
+    if resultado['modulos_tardios_importados']:
+        print(f"FALHA: módulos pesados importados no import do app: "
+              f"{', '.join(resultado['modulos_tardios_importados'])}")
+        falhou = True
+    if not falhou:
+        print("Dentro do orçamento.")
+    return 1 if falhou else 0
+
+
+def resumir(latencias_ms, erros, duracao_s):
+    ordenadas = sorted(latencias_ms)
+    total = len(ordenadas) + erros
+    resumo = {
+        'requisicoes': total,
+        'erros': erros,
+        'taxa_erro': round(erros / total, 4) if total else 0.0,
+        # Só requisições bem-sucedidas: um endpoint que passa a falhar rápido não "ganha" throughput
+        'throughput_rps': round(len(ordenadas) / duracao_s, 2) if duracao_s > 0 else 0.0,
+        'media_ms': round(sum(ordenadas) / len(ordenadas), 2) if ordenadas else 0.0,
+        'max_ms': round(ordenadas[-1], 2) if ordenadas else 0.0,
+    }
+    for p in PERCENTIS:
+        resumo[f'p{p}_ms'] = round(percentil(ordenadas, p), 2)
+    return resumo
+
+
+async def executar_carga(client, mix, concorrencia, requisicoes, duracao, semente):
+    """Executa a carga com `concorrencia` workers e devolve as amostras por endpoint."""
+    rng = random.Random(semente)
+    caminhos = list(mix.keys())
+    pesos = list(mix.values())
+
+    amostras = {c: [] for c in caminhos}
+    erros = {c: 0 for c in caminhos}
+    restantes = requisicoes
+    fim = time.perf_counter() + duracao if duracao else None
+
+    async def worker():
+        nonlocal restantes
+        while True:
+            if fim is not None:
+                if time.perf_counter() >= fim:
+                    return
+            else:
+                if restantes <= 0:
+                    return
+                restantes -= 1
+            caminho = rng.choices(caminhos, weights=pesos)[0]
+            inicio = time.perf_counter()
+            try:
+                resp = await client.get(caminho)
+                await resp.aread()
+                ok = resp.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            decorrido_ms = (time.perf_counter() - inicio) * 1000
+            if ok:
+                amostras[caminho].append(decorrido_ms)
+            else:
+                erros[caminho] += 1
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concorrencia)))
+    return amostras, erros, time.perf_counter() - inicio
+
+
+async def aquecer(client, mix):
+    """Uma requisição por endpoint, fora da medição (cache, JIT de pandas etc.)."""
+    for caminho in mix:
+        try:
+            await client.get(caminho)
+        except httpx.HTTPError:
+            pass
+
+
+async def rodar(args):
+    mix = args.mix or MIX_PADRAO[args.alvo]
+    timeout = httpx.Timeout(args.timeout)
+
+    async def medir(client):
+        if args.aquecimento:
+            await aquecer(client, mix)
+        return await executar_carga(
+            client, mix, args.concorrencia, args.requisicoes, args.duracao, args.semente
+        )
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            amostras, erros, duracao_s = await medir(client)
+    else:
+        modulo = importlib.import_module(args.alvo)
+        asgi_app = modulo.app
+        # O ASGITransport não dispara o lifespan; roda os eventos de startup manualmente
+        async with asgi_app.router.lifespan_context(asgi_app):
+            # Exceções do app viram 500 e contam como erro, em vez de abortar a carga
+            transport = httpx.ASGITransport(app=asgi_app, raise_app_exceptions=False)
+            async with httpx.AsyncClient(
+                transport=transport, base_url='http://loadtest', timeout=timeout
+            ) as client:
+                amostras, erros, duracao_s = await medir(client)
+
+    # Em processo o RSS inclui o app; via http só vale o processo do servidor (--pid)
+    if args.url:
+        memoria = memoria_pico_pid_mb(args.pid) if args.pid else None
+        origem_memoria = 'servidor' if memoria is not None else None
+    else:
+        memoria = memoria_pico_mb()
+        origem_memoria = 'processo (app + cliente)' if memoria is not None else None
+
+    todas = [v for lista in amostras.values() for v in lista]
+    return {
+        'commit': commit_atual(),
+        'config': {
+            'alvo': args.url or args.alvo,
+            'modo': 'http' if args.url else 'in-process',
+            'concorrencia': args.concorrencia,
+            'requisicoes': None if args.duracao else args.requisicoes,
+            'duracao_s': args.duracao,
+            'mix': mix,
+            'semente': args.semente,
+        },
+        'total': resumir(todas, sum(erros.values()), duracao_s),
+        'endpoints': {
+            c: resumir(amostras[c], erros[c], duracao_s) for c in mix
+        },
+        'memoria_pico_mb': round(memoria, 1) if memoria is not None else None,
+        'memoria_origem': origem_memoria,
+        # O PID muda a cada reinício do servidor; fica fora da origem para não impedir a comparação
+        'memoria_pid': args.pid if args.url and memoria is not None else None,
+    }
+
+
+def imprimir(resultado):
+    cfg = resultado['config']
+    print(f"Alvo: {cfg['alvo']} ({cfg['modo']}) | commit {resultado['commit'] or '?'} "
+          f"| concorrência {cfg['concorrencia']}")
+    cabecalho = f"{'endpoint':<32}{'req':>7}{'erros':>7}{'rps':>9}" + ''.join(
+        f"{'p' + str(p):>10}" for p in PERCENTIS
+    )
+    print(cabecalho)  # rps conta apenas requisições bem-sucedidas
+    print('-' * len(cabecalho))
+    linhas = list(resultado['endpoints'].items()) + [('TOTAL', resultado['total'])]
+    for nome, r in linhas:
+        print(f"{nome:<32}{r['requisicoes']:>7}{r['erros']:>7}{r['throughput_rps']:>9}" + ''.join(
+            f"{r[f'p{p}_ms']:>10}" for p in PERCENTIS
+        ))
+    if resultado['memoria_pico_mb'] is not None:
+        origem = resultado['memoria_origem']
+        if resultado.get('memoria_pid'):
+            origem = f"{origem}, pid {resultado['memoria_pid']}"
+        print(f"Memória (pico RSS, {origem}): {resultado['memoria_pico_mb']} MB")
+    else:
+        print("Memória do servidor: n/d (use --pid no modo --url)")
+
+
+def diferencas_config(atual, base):
+    """Lista os campos de configuração que diferem entre duas execuções."""
+    campos = list(CONFIG_COMPARAVEL)
+    # Em processo o alvo é o módulo; via http a URL pode mudar entre máquinas
+    if atual.get('modo') == 'in-process':
+        campos.append('alvo')
+    return [
+        f"{c}: {base.get(c)!r} -> {atual.get(c)!r}"
+        for c in campos if atual.get(c) != base.get(c)
+    ]
+
+
+def comparar(resultado, base, tolerancia):
+    """Compara p95/p99, throughput, erros e memória com uma execução anterior. Retorna as regressões."""
+    regressoes = []
+    pares = [('TOTAL', resultado['total'], base.get('total'))] + [
+        (c, r, base.get('endpoints', {}).get(c)) for c, r in resultado['endpoints'].items()
+    ]
+    for nome, atual, anterior in pares:
+        if not anterior:
+            continue
+        for metrica in ('p95_ms', 'p99_ms'):
+            if anterior[metrica] > 0 and atual[metrica] > anterior[metrica] * (1 + tolerancia / 100):
+                regressoes.append(f"{nome} {metrica}: {anterior[metrica]} -> {atual[metrica]}")
+        if anterior['throughput_rps'] > 0 and \
+                atual['throughput_rps'] < anterior['throughput_rps'] * (1 - tolerancia / 100):
+            regressoes.append(
+                f"{nome} throughput_rps: {anterior['throughput_rps']} -> {atual['throughput_rps']}"
+            )
+        # Qualquer erro novo ou taxa de erro maior que a da base é regressão (sem tolerância)
+        taxa_anterior = anterior['erros'] / anterior['requisicoes'] if anterior.get('requisicoes') else 0.0
+        taxa_atual = atual['erros'] / atual['requisicoes'] if atual['requisicoes'] else 0.0
+        if (anterior['erros'] == 0 and atual['erros'] > 0) or taxa_atual > taxa_anterior:
+            regressoes.append(
+                f"{nome} taxa_erro: {taxa_anterior:.2%} ({anterior['erros']}) -> "
+                f"{taxa_atual:.2%} ({atual['erros']})"
+            )
+    mem_atual, mem_anterior = resultado.get('memoria_pico_mb'), base.get('memoria_pico_mb')
+    # Bases antigas gravavam "servidor (pid N)" na origem; compara só o tipo de fonte
+    origem_anterior = (base.get('memoria_origem') or '').split(' (pid')[0]
+    if mem_atual is not None and mem_anterior and \
+            resultado.get('memoria_origem') == origem_anterior and \
+            mem_atual > mem_anterior * (1 + tolerancia / 100):
+        regressoes.append(f"memoria_pico_mb: {mem_anterior} -> {mem_atual}")
+    return regressoes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Teste de carga da API de estoque.")
+    parser.add_argument('--alvo', choices=sorted(MIX_PADRAO), default='server',
+                        help="Módulo cujo `app` é exercitado em processo (padrão: server)")
+    parser.add_argument('--url', help="Usa um servidor já rodando (ex: http://localhost:8000)")
+    parser.add_argument('--pid', type=int,
+                        help="PID do servidor no modo --url, para medir seu pico de RSS (Linux). "
+                             "O pico é o da vida do processo; reinicie o servidor entre execuções")
+    parser.add_argument('--mix', type=parse_mix,
+                        help='Endpoints e pesos, ex: "/api/insights/risk=3,/api/dados-clusters=1"')
+    parser.add_argument('--concorrencia', type=int, default=8)
+    parser.add_argument('--requisicoes', type=int, default=200)
+    parser.add_argument('--duracao', type=float, default=None,
+                        help="Roda por N segundos em vez de um número fixo de requisições")
+    parser.add_argument('--timeout', type=float, default=60.0)
+    parser.add_argument('--semente', type=int, default=42,
+                        help="Semente do sorteio de endpoints (mantém o mix reprodutível)")
+    parser.add_argument('--sem-aquecimento', dest='aquecimento', action='store_false')
+    parser.add_argument('--saida', help="Salva o resultado em JSON")
+    parser.add_argument('--comparar', help="JSON de uma execução anterior para comparação")
+    parser.add_argument('--tolerancia', type=float, default=15.0,
+                        help="Piora percentual aceita antes de acusar regressão (padrão: 15)")
+    parser.add_argument('--ignorar-config', action='store_true',
+                        help="Compara mesmo se a configuração da execução base for diferente")
+    parser.add_argument('--orcamento-importacao', type=float, default=None, metavar='MS',
+                        help="Só verifica o tempo de `import <alvo>` contra este orçamento e sai")
+    parser.add_argument('--repeticoes-importacao', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    if args.concorrencia < 1:
+        parser.error("--concorrencia deve ser >= 1")
+
+    if args.pid and not args.url:
+        parser.error("--pid só se aplica ao modo --url")
+
+    if args.orcamento_importacao is not None:
+        return checar_importacao(args)
+
+    base = None
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            base = json.load(f)
+
+    resultado = asyncio.run(rodar(args))
+    imprimir(resultado)
+
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        print(f"Resultado salvo em {args.saida}")
+
+    if base is not None:
+        diferencas = diferencas_config(resultado['config'], base.get('config', {}))
+        if diferencas:
+            print(f"ATENÇÃO: configuração diferente da execução base ({args.comparar}):")
+            for d in diferencas:
+                print(f"  {d}")
+            if not args.ignorar_config:
+                print("Resultados não comparáveis; rode com a mesma configuração ou use --ignorar-config.")
+                return 2
+        regressoes = comparar(resultado, base, args.tolerancia)
+        if regressoes:
+            print(f"REGRESSÃO (tolerância {args.tolerancia}%) em relação a {base.get('commit') or args.comparar}:")
+            for r in regressoes:
+                print(f"  {r}")
+            return 1
+        print(f"Sem regressões em relação a {base.get('commit') or args.comparar}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
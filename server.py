@@ -1,8 +1,9 @@
 # server.py
+import importlib.util
+import os
+import threading
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
@@ -27,6 +28,28 @@ MIN_ITENS_POR_GRUPO = 10
 COLUNA_CLASSE = 'ds_grupo_material'
 COLUNA_NOME_ITEM = 'ds_material_hospital'
 
+# Configurações de Inicialização
+# CARREGAMENTO_DADOS: 'background' (padrão) responde de imediato e aquece em segundo plano,
+# 'startup' carrega antes de servir, 'lazy' carrega apenas na primeira requisição.
+MODOS_CARREGAMENTO = ('background', 'startup', 'lazy')
+MODO_CARREGAMENTO = os.environ.get('CARREGAMENTO_DADOS', 'background').strip().lower()
+if MODO_CARREGAMENTO not in MODOS_CARREGAMENTO:
+    raise ValueError(
+        f"CARREGAMENTO_DADOS inválido: {MODO_CARREGAMENTO!r}. "
+        f"Use um de: {', '.join(MODOS_CARREGAMENTO)}"
+    )
+ARQUIVO_DADOS = 'df_analise.csv.gz'
+# Snapshot colunar (Parquet) gerado a partir do CSV; bem mais rápido de ler
+ARQUIVO_SNAPSHOT = os.environ.get('SNAPSHOT_DADOS', 'df_analise.parquet')
+
+_lock_dados = threading.Lock()
+# mtime do CSV de origem quando os dados em memória foram carregados
+_mtime_carregado = None
+# Sem engine Parquet (pyarrow/fastparquet) o snapshot fica desativado; também desativa após falha
+_snapshot_habilitado = any(
+    importlib.util.find_spec(engine) is not None for engine in ('pyarrow', 'fastparquet')
+)
+
 regras_agregacao = {
     'qt_estoque': 'mean',
     'qt_consumo': 'sum',
@@ -52,22 +75,62 @@ def gerar_dados_sinteticos():
     }
     return pd.DataFrame(data)
 
-def carregar_dados():
-    """Carrega e normaliza os dados."""
-    df = None
+def snapshot_valido():
+    """O snapshot só é usado se existir e não for mais antigo que o CSV de origem."""
+    if not os.path.exists(ARQUIVO_SNAPSHOT):
+        return False
+    if os.path.exists(ARQUIVO_DADOS):
+        return os.path.getmtime(ARQUIVO_SNAPSHOT) >= os.path.getmtime(ARQUIVO_DADOS)
+    return True
+
+def salvar_snapshot(df):
+    """Grava o snapshot colunar de forma atômica (arquivo temporário + os.replace)."""
+    global _snapshot_habilitado
+    if not _snapshot_habilitado:
+        return
+    temporario = f"{ARQUIVO_SNAPSHOT}.{os.getpid()}.tmp"
+    try:
+        df.to_parquet(temporario, index=False)
+        os.replace(temporario, ARQUIVO_SNAPSHOT)
+        print(f"Snapshot colunar salvo em '{ARQUIVO_SNAPSHOT}'.")
+    except Exception as e:
+        # Não tenta de novo a cada carga; o CSV continua sendo a fonte
+        _snapshot_habilitado = False
+        print(f"Não foi possível salvar o snapshot colunar (desativado): {e}")
+        if os.path.exists(temporario):
+            os.remove(temporario)
+
+def ler_csv():
+    """Lê o CSV de origem (com fallbacks) e atualiza o snapshot colunar."""
     try:
         # Tenta carregar o arquivo principal do projeto
-        print("Tentando ler 'df_analise.csv.gz'...")
-        df = pd.read_csv("df_analise.csv.gz", sep=',', encoding='utf-8', on_bad_lines='warn', compression='gzip')
+        print(f"Tentando ler '{ARQUIVO_DADOS}'...")
+        df = pd.read_csv(ARQUIVO_DADOS, sep=',', encoding='utf-8', on_bad_lines='warn', compression='gzip')
         print(f"Sucesso! Carregados {len(df)} registros.")
+        salvar_snapshot(df)
+        return df
     except Exception as e:
         print(f"Arquivo principal não encontrado: {e}")
         try:
             print("Tentando ler 'estoque.csv'...")
-            df = pd.read_csv("estoque.csv", sep=';', encoding='latin1', on_bad_lines='warn')
+            return pd.read_csv("estoque.csv", sep=';', encoding='latin1', on_bad_lines='warn')
         except Exception as e2:
             print(f"Nenhum arquivo CSV encontrado. Usando fallback. Erro: {e2}")
-            df = gerar_dados_sinteticos()
+            return gerar_dados_sinteticos()
+
+def carregar_dados():
+    """Carrega e normaliza os dados (snapshot colunar se disponível, senão CSV)."""
+    df = None
+    if _snapshot_habilitado and snapshot_valido():
+        try:
+            print(f"Lendo snapshot colunar '{ARQUIVO_SNAPSHOT}'...")
+            df = pd.read_parquet(ARQUIVO_SNAPSHOT)
+            print(f"Sucesso! Carregados {len(df)} registros.")
+        except Exception as e:
+            print(f"Falha ao ler o snapshot, voltando ao CSV: {e}")
+
+    if df is None:
+        df = ler_csv()
 
     # Normalização de nomes para garantir que insights.py funcione
     if 'ds_item' in df.columns and COLUNA_NOME_ITEM not in df.columns:
@@ -80,6 +143,10 @@ def carregar_dados():
 
 def processar_clusters(df):
     """Lógica de Clusterização K-Means (igual ao Notebook)"""
+    # Import tardio: o sklearn domina o tempo de importação e só é necessário aqui
+    from sklearn.preprocessing import StandardScaler
+    from sklearn.cluster import KMeans
+
     print("--- Processando Clusters ---")
     cols_identificadores = ['id_item', COLUNA_NOME_ITEM, COLUNA_CLASSE]
     
@@ -144,18 +211,59 @@ def processar_clusters(df):
     
     return []
 
+def mtime_dados():
+    """mtime do CSV de origem (None se não existir)."""
+    return os.path.getmtime(ARQUIVO_DADOS) if os.path.exists(ARQUIVO_DADOS) else None
+
+def _carregar_com_lock():
+    # Único caminho que chama carregar_dados (e grava o snapshot); exige _lock_dados
+    global _mtime_carregado
+    mtime = mtime_dados()
+    insights.set_df_raw(carregar_dados())
+    _mtime_carregado = mtime
+
+def garantir_dados():
+    """Carrega os dados uma única vez; chamadas concorrentes aguardam o carregamento em curso."""
+    with _lock_dados:
+        if insights.df_raw_storage is None:
+            _carregar_com_lock()
+
+def recarregar_se_alterado():
+    """Recarrega os dados (troca atômica sob o lock) se o CSV de origem mudou desde a carga."""
+    with _lock_dados:
+        if insights.df_raw_storage is None or mtime_dados() != _mtime_carregado:
+            _carregar_com_lock()
+
+# Endpoints de insights carregam os dados no primeiro uso se ainda não estiverem prontos
+insights.set_carregador(garantir_dados)
+
+def aquecer():
+    """Pré-carrega dados e sklearn em segundo plano para que a primeira requisição seja rápida."""
+    garantir_dados()
+    import sklearn.cluster, sklearn.preprocessing  # noqa: F401
+    print("Aquecimento concluído.")
+
+@app.get("/api/health")
+async def get_health():
+    # Async para não disputar o threadpool com os endpoints pesados; responde sem esperar os dados
+    return {"status": "ok", "dados_carregados": insights.df_raw_storage is not None}
+
 @app.get("/api/dados-clusters")
 def get_clusters():
-    df = carregar_dados()
-    # Atualiza os dados no módulo de insights também
-    insights.set_df_raw(df)
-    return processar_clusters(df)
+    # Como antes, esta rota atualiza os dados dos insights; agora só relê se o CSV mudou
+    recarregar_se_alterado()
+    return processar_clusters(insights.df_raw_storage)
 
 @app.on_event("startup")
 async def startup_event():
-    print("Iniciando servidor e pré-carregando dados...")
-    df = carregar_dados()
-    insights.set_df_raw(df)
+    if MODO_CARREGAMENTO == 'startup':
+        print("Iniciando servidor e pré-carregando dados...")
+        garantir_dados()
+    elif MODO_CARREGAMENTO == 'lazy':
+        print("Iniciando servidor; dados serão carregados na primeira requisição.")
+    else:  # 'background'
+        print("Iniciando servidor; aquecendo dados em segundo plano...")
+        threading.Thread(target=aquecer, name="aquecimento", daemon=True).start()
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file